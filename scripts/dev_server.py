@@ -13,12 +13,24 @@ src_path = project_root / "src"
 sys.path.insert(0, str(src_path))
 
 from dotenv import load_dotenv
-from stock_agent.web import create_web_app
 
 
 def main():
     """Run the development server with hot reloading and dev features"""
 
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Stock Agent dev server')
+    parser.add_argument(
+        '--generate-summary',
+        action='store_true',
+        help='Generate a market summary in the background after startup'
+    )
+    args, unknown_args = parser.parse_known_args()
+
+    # Pass unknown args back to sys.argv for Robyn to process
+    sys.argv = [sys.argv[0]] + unknown_args
+
     # Load development environment variables
     env_path = project_root / '.dev.env'
     if env_path.exists():
@@ -27,6 +39,15 @@ def main():
     else:
         print(f"⚠️  Warning: {env_path} not found, using system environment")
 
+    # Dev data is disposable, so keep the auth DB on tmpfs where
+    # available — every auth query then skips block-layer IO entirely
+    if 'AUTH_DB_PATH' not in os.environ and os.path.isdir('/dev/shm'):
+        os.environ['AUTH_DB_PATH'] = '/dev/shm/stock_agent_users.db'
+
+    # Imported here so the app (and everything it pulls in transitively)
+    # loads after the env file is in place, not at module import time
+    from stock_agent.web import create_web_app
+
     # Create web application
     print("🚀 Creating web application...")
     app = create_web_app()
@@ -35,7 +56,9 @@ def main():
     host = os.getenv('DEV_HOST', '0.0.0.0')
     port = int(os.getenv('DEV_PORT', '8080'))
 
-    print(f"""
+    # Only pay for formatting/printing the banner when someone is watching
+    if sys.stdout.isatty():
+        print(f"""
 🔥 Starting development server...
 
    URL: http://{host}:{port}
@@ -52,6 +75,22 @@ def main():
 
    Press Ctrl+C to stop the server
    """)
+    else:
+        print(f"Starting development server on http://{host}:{port}")
+
+    if args.generate_summary:
+        # Deferred import: polygon + pandas only load when asked for, and
+        # the summary runs in the background so startup isn't blocked
+        import threading
+        from stock_agent.polygon.stock_service import StockService
+
+        def _gen_summary():
+            try:
+                StockService().generate_market_summary()
+            except Exception as e:
+                print(f"⚠️  Market summary generation failed: {e}")
+
+        threading.Thread(target=_gen_summary, daemon=True).start()
 
     try:
         # Start server in development mode
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+One-shot migration: convert ISO-text timestamps to unix epoch integers.
+
+Databases created before the epoch-default change store created_at /
+added_at / updated_at as ISO text ('2025-01-01 12:00:00'); new rows are
+stored as integer epoch seconds. Mixed types would sort incorrectly.
+
+Opening the database through the app is the full upgrade:
+AuthService._init_db (schema version 2) rebuilds legacy tables so the
+epoch default applies to future inserts, then normalizes existing
+values. This script only rewrites stored values — it cannot change the
+old DEFAULT CURRENT_TIMESTAMP, so it is a stopgap for databases that
+can't be opened through the app. Safe to re-run — already-numeric
+values are left untouched.
+
+Usage: python scripts/migrate_timestamps.py [path/to/users.db]
+"""
+import sqlite3
+import sys
+
+# (table, column) pairs that moved from ISO text to epoch integers
+COLUMNS = [
+    ("users", "created_at"),
+    ("user_favorites", "added_at"),
+    ("device_tokens", "created_at"),
+    ("device_tokens", "updated_at"),
+    ("whatsapp_recommendations", "created_at"),
+    ("trades", "created_at"),
+]
+
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "users.db"
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            for table, column in COLUMNS:
+                cursor = conn.execute(f"""
+                    UPDATE {table}
+                    SET {column} = CAST(strftime('%s', {column}) AS INTEGER)
+                    WHERE typeof({column}) = 'text'
+                      AND strftime('%s', {column}) IS NOT NULL
+                """)
+                print(f"{table}.{column}: {cursor.rowcount} rows migrated")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,14 @@
 from .auth_service import AuthService
-from .firebase_auth_service import FirebaseAuthService
 from .models import User
 
 __all__ = ['AuthService', 'FirebaseAuthService', 'User']
+
+
+def __getattr__(name):
+    # FirebaseAuthService drags in the Firebase Admin SDK (hundreds of
+    # ms), so it is resolved lazily — CLI paths that only need
+    # AuthService never pay for it
+    if name == 'FirebaseAuthService':
+        from .firebase_auth_service import FirebaseAuthService
+        return FirebaseAuthService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
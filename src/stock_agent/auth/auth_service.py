@@ -1,243 +1,637 @@
+import asyncio
+import atexit
+import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from typing import Optional, List, Dict
 from datetime import datetime
 from .models import User, StockFavorite
 
+logger = logging.getLogger(__name__)
+
+
+_SQL_USER_COLUMNS = "id, username, email, firebase_uid, created_at, is_active"
+_SQL_USER_BY_EMAIL = (
+    f"SELECT {_SQL_USER_COLUMNS} FROM users WHERE email = ? AND is_active = 1"
+)
+_SQL_USER_BY_UID = (
+    f"SELECT {_SQL_USER_COLUMNS} FROM users WHERE firebase_uid = ? AND is_active = 1"
+)
+
+
+def _convert_timestamp(value: bytes):
+    """TIMESTAMP converter run from the C fetch layer.
+
+    Falls back to the raw text for values that aren't ISO timestamps
+    (e.g. WhatsApp feeds us whatever the bridge sent).
+    """
+    text = value.decode()
+    if text.isdigit():
+        # Epoch seconds (the DDL default); cheaper to store and parse
+        # than ISO text
+        return datetime.fromtimestamp(int(text))
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+# Registering our own converter also avoids the deprecated (3.12)
+# default datetime adapters.
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+
+# INSERT ... RETURNING needs SQLite 3.35+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Bump whenever _init_db's schema changes; stored in PRAGMA user_version
+# so steady-state startups skip DDL entirely.
+# Version history:
+#   1 — epoch-second timestamp defaults, WITHOUT ROWID tables, covering
+#       indexes
+#   2 — rebuilds pre-epoch tables (their DEFAULT CURRENT_TIMESTAMP would
+#       keep writing ISO text) and normalizes leftover text timestamps
+_SCHEMA_VERSION = 2
+
+# (table, column) pairs whose defaults moved from ISO text to epoch
+# seconds; _init_db rewrites any remaining text values on upgrade
+_TIMESTAMP_COLUMNS = [
+    ("users", "created_at"),
+    ("user_favorites", "added_at"),
+    ("device_tokens", "created_at"),
+    ("device_tokens", "updated_at"),
+    ("whatsapp_recommendations", "created_at"),
+    ("trades", "created_at"),
+]
+
+# Table definitions, templated on the table name so the v2 migration can
+# instantiate a "{table}_new" replacement from the same DDL that fresh
+# databases get. Natural composite keys use WITHOUT ROWID so each row
+# lives in the primary-key B-tree itself instead of a rowid tree plus a
+# unique index.
+_TABLE_DDL = {
+    "users": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            firebase_uid TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT (strftime('%s', 'now')),
+            is_active BOOLEAN DEFAULT 1
+        )""",
+    "user_favorites": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            user_id INTEGER NOT NULL,
+            ticker TEXT NOT NULL,
+            company_name TEXT,
+            added_at TIMESTAMP DEFAULT (strftime('%s', 'now')),
+            PRIMARY KEY (user_id, ticker),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) WITHOUT ROWID""",
+    "device_tokens": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            user_id INTEGER NOT NULL,
+            token TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT (strftime('%s', 'now')),
+            updated_at TIMESTAMP DEFAULT (strftime('%s', 'now')),
+            is_active BOOLEAN DEFAULT 1,
+            PRIMARY KEY (user_id, token),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) WITHOUT ROWID""",
+    "whatsapp_recommendations": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker TEXT NOT NULL,
+            company_name TEXT,
+            price REAL,
+            change_percent REAL,
+            from_sender TEXT NOT NULL,
+            chat_name TEXT NOT NULL,
+            original_message TEXT NOT NULL,
+            received_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT (strftime('%s', 'now')),
+            status TEXT DEFAULT 'pending'
+                CHECK(status IN ('pending', 'accepted', 'rejected'))
+        )""",
+    "trades": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            ticker TEXT NOT NULL,
+            action TEXT NOT NULL CHECK(action IN ('BUY', 'SELL')),
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            trade_date TEXT NOT NULL,
+            notes TEXT,
+            whatsapp_recommendation_id INTEGER,
+            created_at TIMESTAMP DEFAULT (strftime('%s', 'now')),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (whatsapp_recommendation_id) REFERENCES whatsapp_recommendations (id)
+        )""",
+}
+
+
+def _user_from_row(row) -> User:
+    """Materialize a User from a users SELECT row."""
+    return User(
+        id=row[0],
+        username=row[1],
+        email=row[2],
+        firebase_uid=row[3],
+        created_at=row[4],
+        is_active=bool(row[5]),
+    )
+
+
+def _favorite_from_row(row) -> StockFavorite:
+    """Materialize a StockFavorite from a user_favorites SELECT row.
+
+    user_favorites is WITHOUT ROWID, so there is no surrogate id.
+    """
+    return StockFavorite(
+        user_id=row[0],
+        ticker=row[1],
+        company_name=row[2],
+        added_at=row[3],
+    )
+
+
+class _ReaderPool:
+    """Lazily-filled pool of long-lived read-only connections.
+
+    WAL mode lets any number of readers run concurrently with the single
+    writer, so we keep up to ``size`` connections alive and hand them out
+    round-robin instead of paying connect/teardown on every query.
+    """
+
+    def __init__(self, connect, size: Optional[int] = None):
+        self._connect = connect
+        self._size = size or os.cpu_count() or 4
+        self._created = 0
+        self._lock = threading.Lock()
+        self._pool: queue.Queue = queue.Queue()
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self._size:
+                self._created += 1
+                return self._connect()
+        return self._pool.get()
+
+    def release(self, conn: sqlite3.Connection):
+        self._pool.put(conn)
+
+
+class _TTLCache:
+    """Tiny size-bounded TTL cache (LRU eviction, thread-safe)."""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._data: OrderedDict = OrderedDict()  # key -> (value, expires_at)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.time() >= expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_if(self, predicate):
+        """Drop every entry whose value matches the predicate."""
+        with self._lock:
+            for key in [k for k, (v, _) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+
 class AuthService:
     def __init__(self, db_path: str = "users.db"):
         self.db_path = db_path
         self._init_db()
+        self._readers = _ReaderPool(lambda: self._connect(pooled=True))
+        self._writer_lock = threading.Lock()
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        # User rows are small and change rarely, so repeat lookups on the
+        # request hot path can skip SQLite entirely for a minute at a time.
+        self._user_by_email = _TTLCache()
+        self._user_by_uid = _TTLCache()
+        # Refresh planner statistics on shutdown, per the SQLite docs'
+        # recommendation — keeps query plans aligned with data growth
+        atexit.register(self._optimize_on_exit)
+
+    def _optimize_on_exit(self):
+        """Run PRAGMA optimize before the process exits."""
+        try:
+            with self._writer_lock:
+                if self._writer_conn is not None:
+                    self._writer_conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+
+    def _cache_user(self, user: User):
+        """Populate both lookup caches with the same User object."""
+        self._user_by_email.put(user.email, user)
+        if user.firebase_uid:
+            self._user_by_uid.put(user.firebase_uid, user)
+
+    def invalidate_user(self, user_id: int):
+        """Drop a user from the lookup caches after an out-of-band change."""
+        self._user_by_email.pop_if(lambda u: u.id == user_id)
+        self._user_by_uid.pop_if(lambda u: u.id == user_id)
+
+    @contextmanager
+    def _reader(self):
+        """Borrow a pooled read connection."""
+        conn = self._readers.acquire()
+        try:
+            yield conn
+        finally:
+            self._readers.release(conn)
+
+    @contextmanager
+    def _writer(self):
+        """Borrow the single long-lived write connection.
+
+        BEGIN IMMEDIATE takes the write lock up front so concurrent
+        writers queue on busy_timeout instead of failing mid-transaction
+        with SQLITE_BUSY.
+        """
+        with self._writer_lock:
+            if self._writer_conn is None:
+                self._writer_conn = self._connect(pooled=True)
+            conn = self._writer_conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _connect(self, pooled: bool = False) -> sqlite3.Connection:
+        """Open a connection with the tuned PRAGMAs applied.
+
+        WAL mode is persistent once set on the database file, but
+        busy_timeout/cache_size/etc. are per-connection, so every
+        connection goes through this factory. Pooled connections are
+        shared across threads, which is safe because the pool hands each
+        one to a single borrower at a time.
+        """
+        # cached_statements keeps prepared statements around per
+        # connection, so the hot per-request SELECTs skip the SQL
+        # parse/prepare step after their first execution.
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=not pooled,
+            cached_statements=512,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+        )
+        conn.row_factory = sqlite3.Row
+        # WAL doesn't apply to in-memory databases
+        if self.db_path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=memory")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
 
     def _init_db(self):
         """Initialize the user database"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    firebase_uid TEXT UNIQUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            """)
-            
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS user_favorites (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    ticker TEXT NOT NULL,
-                    company_name TEXT,
-                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    UNIQUE(user_id, ticker)
-                )
-            """)
-            
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS device_tokens (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    token TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    UNIQUE(user_id, token)
-                )
-            """)
+        with self._connect() as conn:
+            # Databases stamped with the current schema version skip the
+            # DDL below — startup is then a single integer PRAGMA read.
+            # Older databases (user_version 0) fall through to the
+            # idempotent CREATE/ALTER statements and get stamped at the
+            # end.
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= _SCHEMA_VERSION:
+                return
 
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS whatsapp_recommendations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    ticker TEXT NOT NULL,
-                    company_name TEXT,
-                    price REAL,
-                    change_percent REAL,
-                    from_sender TEXT NOT NULL,
-                    chat_name TEXT NOT NULL,
-                    original_message TEXT NOT NULL,
-                    received_at TIMESTAMP NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            for table, ddl in _TABLE_DDL.items():
+                conn.execute(ddl.format(name=table))
 
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS trades (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    ticker TEXT NOT NULL,
-                    action TEXT NOT NULL CHECK(action IN ('BUY', 'SELL')),
-                    quantity INTEGER NOT NULL,
-                    price REAL NOT NULL,
-                    trade_date TEXT NOT NULL,
-                    notes TEXT,
-                    whatsapp_recommendation_id INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (whatsapp_recommendation_id) REFERENCES whatsapp_recommendations (id)
+            # Tables created before the epoch-second defaults still carry
+            # DEFAULT CURRENT_TIMESTAMP, so a one-time value rewrite
+            # would not stick — every later insert would store ISO text
+            # again. SQLite can't ALTER a default, so rebuild each such
+            # table from the current DDL: copy into {table}_new, drop
+            # the original, rename. Shared columns carry their data over;
+            # columns new to the DDL (e.g. status) take their defaults.
+            legacy = [
+                row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                    " AND sql LIKE '%CURRENT_TIMESTAMP%'"
                 )
+                if row[0] in _TABLE_DDL
+            ]
+            if legacy:
+                # No transaction is open here, so the pragma takes
+                # effect; it must be off while originals are dropped out
+                # from under their foreign keys
+                conn.execute("PRAGMA foreign_keys=OFF")
+                for table in legacy:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}_new")
+                    conn.execute(_TABLE_DDL[table].format(name=f"{table}_new"))
+                    new_cols = [
+                        row[1] for row in conn.execute(f"PRAGMA table_info({table}_new)")
+                    ]
+                    old_cols = {
+                        row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+                    }
+                    shared = ", ".join(c for c in new_cols if c in old_cols)
+                    conn.execute(
+                        f"INSERT INTO {table}_new ({shared}) SELECT {shared} FROM {table}"
+                    )
+                    conn.execute(f"DROP TABLE {table}")
+                    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+                conn.commit()
+                conn.execute("PRAGMA foreign_keys=ON")
+
+            # Single executescript keeps index setup to one parse/prepare
+            # pass; these cover the hot per-request lookups. Runs after
+            # the rebuild, which drops any indexes on the original tables.
+            conn.executescript("""
+                CREATE INDEX IF NOT EXISTS idx_fav_user
+                    ON user_favorites(user_id, added_at DESC);
+                DROP INDEX IF EXISTS idx_tok_user;
+                CREATE INDEX IF NOT EXISTS idx_tok_cover
+                    ON device_tokens(user_id, is_active, token);
+                DROP INDEX IF EXISTS idx_trades_user;
+                CREATE INDEX IF NOT EXISTS idx_trades_user_date
+                    ON trades(user_id, trade_date DESC, created_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_trades_user_ticker
+                    ON trades(user_id, ticker, trade_date);
+                CREATE INDEX IF NOT EXISTS idx_wa_recs_received
+                    ON whatsapp_recommendations(received_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_wa_recs_status
+                    ON whatsapp_recommendations(status, received_at DESC);
             """)
 
-            # Add status column to whatsapp_recommendations if it doesn't exist
-            try:
-                conn.execute("""
-                    ALTER TABLE whatsapp_recommendations
-                    ADD COLUMN status TEXT DEFAULT 'pending'
-                    CHECK(status IN ('pending', 'accepted', 'rejected'))
+            # Rows copied over from a legacy table still hold ISO text in
+            # these columns; SQLite orders INTEGER before TEXT, so mixed
+            # values would silently break every ORDER BY over them.
+            # Rewrite them to epochs — a no-op on fresh databases and
+            # safe to re-run.
+            for table, column in _TIMESTAMP_COLUMNS:
+                conn.execute(f"""
+                    UPDATE {table}
+                    SET {column} = CAST(strftime('%s', {column}) AS INTEGER)
+                    WHERE typeof({column}) = 'text'
+                      AND strftime('%s', {column}) IS NOT NULL
                 """)
-            except sqlite3.OperationalError:
-                # Column already exists, ignore
-                pass
 
+            # Seed planner statistics so the first real queries don't run
+            # on default estimates; later refreshes come from the
+            # PRAGMA optimize hook at shutdown
+            conn.execute("ANALYZE")
+
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
             conn.commit()
 
+    def create_users_bulk(self, rows: List[tuple]) -> int:
+        """Create many users in one transaction.
+
+        Takes (username, email, firebase_uid) tuples; rows that collide
+        with an existing username, email, or UID are skipped. One commit
+        covers the whole batch. Returns the number of rows inserted.
+        """
+        with self._writer() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO users (username, email, firebase_uid) VALUES (?, ?, ?)",
+                rows
+            )
+            return cursor.rowcount
+
+    def get_colliding_usernames(self, base: str) -> set:
+        """Return every existing username that is ``base`` or ``base_N``.
+
+        One round-trip regardless of how many collisions exist, so
+        callers can pick a free suffix in Python instead of probing the
+        database once per candidate.
+        """
+        with self._reader() as conn:
+            cursor = conn.execute(
+                "SELECT username FROM users WHERE username = ? OR username GLOB ?",
+                (base, f"{base}_[0-9]*")
+            )
+            return {row[0] for row in cursor}
+
     def create_user_from_firebase(self, username: str, email: str, firebase_uid: str) -> Optional[User]:
         """Create a new user from Firebase authentication"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
+        with self._writer() as conn:
+            if _HAS_RETURNING:
+                # OR IGNORE + RETURNING keeps the duplicate path
+                # exception-free: an ignored insert simply yields no row.
+                # created_at is what SQLite actually stored rather than a
+                # Python clock read.
+                row = conn.execute(
+                    "INSERT OR IGNORE INTO users (username, email, firebase_uid) VALUES (?, ?, ?) RETURNING id, created_at",
+                    (username, email, firebase_uid)
+                ).fetchone()
+                if row is None:
+                    return None
+                user_id, created_at = row[0], row[1]
+            else:
                 cursor = conn.execute(
-                    "INSERT INTO users (username, email, firebase_uid) VALUES (?, ?, ?)",
+                    "INSERT OR IGNORE INTO users (username, email, firebase_uid) VALUES (?, ?, ?)",
                     (username, email, firebase_uid)
                 )
-                user_id = cursor.lastrowid
-                conn.commit()
-                
-                return User(
-                    id=user_id,
-                    username=username,
-                    email=email,
-                    firebase_uid=firebase_uid,
-                    created_at=datetime.now(),
-                    is_active=True
-                )
+                if cursor.rowcount == 0:
+                    return None
+                user_id, created_at = cursor.lastrowid, datetime.now()
+
+        # Cached only after the _writer() context has committed — caching
+        # inside the transaction would serve a phantom user for the TTL
+        # window if the commit rolled back
+        user = User(
+            id=user_id,
+            username=username,
+            email=email,
+            firebase_uid=firebase_uid,
+            created_at=created_at,
+            is_active=True
+        )
+        self._cache_user(user)
+        return user
+    
+    def upsert_firebase_user(self, username: str, email: str, firebase_uid: str) -> Optional[User]:
+        """Insert or fetch a Firebase-backed user in one round-trip.
+
+        A returning user hits ON CONFLICT(firebase_uid) and comes back
+        with their stored row (email refreshed from Firebase); a new
+        user is inserted. Either way one statement replaces the
+        lookup-then-create dance.
+        """
+        if not _HAS_RETURNING:
+            user = self.get_user_by_firebase_uid(firebase_uid)
+            if user:
+                return user
+            return self.create_user_from_firebase(username, email, firebase_uid)
+
+        try:
+            with self._writer() as conn:
+                row = conn.execute("""
+                    INSERT INTO users (username, email, firebase_uid)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(firebase_uid) DO UPDATE SET email = excluded.email
+                    RETURNING id, username, email, firebase_uid, created_at, is_active
+                """, (username, email, firebase_uid)).fetchone()
         except sqlite3.IntegrityError:
+            # username/email collides with a different account
             return None
-    
+
+        # Cache after commit so a rolled-back write can't leave a
+        # phantom user in the TTL caches
+        user = _user_from_row(row)
+        self._cache_user(user)
+        return user
+
     def get_user_by_email(self, email: str) -> Optional[User]:
         """Get user by email address"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT id, username, email, firebase_uid, created_at, is_active FROM users WHERE email = ? AND is_active = 1",
-                (email,)
-            )
+        cached = self._user_by_email.get(email)
+        if cached is not None:
+            return cached
+
+        with self._reader() as conn:
+            cursor = conn.execute(_SQL_USER_BY_EMAIL, (email,))
             row = cursor.fetchone()
             
             if row:
-                return User(
-                    id=row[0],
-                    username=row[1],
-                    email=row[2],
-                    firebase_uid=row[3],
-                    created_at=datetime.fromisoformat(row[4]) if row[4] else None,
-                    is_active=bool(row[5])
-                )
+                user = _user_from_row(row)
+                self._cache_user(user)
+                return user
         return None
     
     def get_user_by_firebase_uid(self, firebase_uid: str) -> Optional[User]:
         """Get user by Firebase UID"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT id, username, email, firebase_uid, created_at, is_active FROM users WHERE firebase_uid = ? AND is_active = 1",
-                (firebase_uid,)
-            )
+        cached = self._user_by_uid.get(firebase_uid)
+        if cached is not None:
+            return cached
+
+        with self._reader() as conn:
+            cursor = conn.execute(_SQL_USER_BY_UID, (firebase_uid,))
             row = cursor.fetchone()
             
             if row:
-                return User(
-                    id=row[0],
-                    username=row[1],
-                    email=row[2],
-                    firebase_uid=row[3],
-                    created_at=datetime.fromisoformat(row[4]) if row[4] else None,
-                    is_active=bool(row[5])
-                )
+                user = _user_from_row(row)
+                self._cache_user(user)
+                return user
         return None
     
     def add_favorite(self, user_id: int, ticker: str, company_name: Optional[str] = None) -> bool:
         """Add a stock to user's favorites"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    "INSERT INTO user_favorites (user_id, ticker, company_name) VALUES (?, ?, ?)",
-                    (user_id, ticker.upper(), company_name)
-                )
-                conn.commit()
-                return True
-        except sqlite3.IntegrityError:
-            return False  # Already exists
+        with self._writer() as conn:
+            # upper() runs in SQLite's C layer; tickers are ASCII so
+            # it matches Python's str.upper for our inputs. OR IGNORE +
+            # rowcount detects duplicates without raising.
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO user_favorites (user_id, ticker, company_name) VALUES (?, upper(?), ?)",
+                (user_id, ticker, company_name)
+            )
+            return cursor.rowcount > 0
     
+    def add_favorites(self, user_id: int, tickers: List[tuple]) -> int:
+        """Add multiple favorites in one transaction.
+
+        Takes (ticker, company_name) pairs; duplicates are skipped.
+        Returns the number of rows actually inserted. Batching all
+        inserts into a single commit pays one fsync instead of one per
+        favorite.
+        """
+        with self._writer() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO user_favorites (user_id, ticker, company_name) VALUES (?, upper(?), ?)",
+                [(user_id, ticker, company_name) for ticker, company_name in tickers]
+            )
+            return cursor.rowcount
+
     def remove_favorite(self, user_id: int, ticker: str) -> bool:
         """Remove a stock from user's favorites"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._writer() as conn:
             cursor = conn.execute(
-                "DELETE FROM user_favorites WHERE user_id = ? AND ticker = ?",
-                (user_id, ticker.upper())
+                "DELETE FROM user_favorites WHERE user_id = ? AND ticker = upper(?)",
+                (user_id, ticker)
             )
-            conn.commit()
             return cursor.rowcount > 0
     
     def get_user_favorites(self, user_id: int) -> List[StockFavorite]:
         """Get all favorites for a user"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._reader() as conn:
             cursor = conn.execute(
-                "SELECT id, user_id, ticker, company_name, added_at FROM user_favorites WHERE user_id = ? ORDER BY added_at DESC",
+                "SELECT user_id, ticker, company_name, added_at FROM user_favorites WHERE user_id = ? ORDER BY added_at DESC",
                 (user_id,)
             )
-            rows = cursor.fetchall()
-            
-            favorites = []
-            for row in rows:
-                favorites.append(StockFavorite(
-                    id=row[0],
-                    user_id=row[1],
-                    ticker=row[2],
-                    company_name=row[3],
-                    added_at=datetime.fromisoformat(row[4]) if row[4] else None
-                ))
-            return favorites
+            return [_favorite_from_row(row) for row in cursor]
 
     def save_device_token(self, user_id: int, token: str) -> bool:
         """Save or update a device token for a user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                # Use INSERT OR REPLACE to handle duplicates
+            with self._writer() as conn:
+                # UPSERT updates the row in place on conflict instead of
+                # delete+insert, preserving the original created_at
                 conn.execute("""
-                    INSERT OR REPLACE INTO device_tokens (user_id, token, updated_at)
-                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                    INSERT INTO device_tokens (user_id, token)
+                    VALUES (?, ?)
+                    ON CONFLICT(user_id, token)
+                    DO UPDATE SET updated_at = strftime('%s', 'now'), is_active = 1
                 """, (user_id, token))
-                conn.commit()
                 return True
-        except sqlite3.Error as e:
-            print(f"Error saving device token: {e}")
+        except sqlite3.Error:
+            logger.exception("Error saving device token")
             return False
 
     def get_user_device_tokens(self, user_id: int) -> List[str]:
         """Get all active device tokens for a user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._reader() as conn:
                 cursor = conn.execute(
                     "SELECT token FROM device_tokens WHERE user_id = ? AND is_active = 1",
                     (user_id,)
                 )
-                rows = cursor.fetchall()
-                return [row[0] for row in rows]
-        except sqlite3.Error as e:
-            print(f"Error getting device tokens: {e}")
+                return [row[0] for row in cursor]
+        except sqlite3.Error:
+            logger.exception("Error getting device tokens")
             return []
 
     def deactivate_device_token(self, user_id: int, token: str) -> bool:
         """Deactivate a specific device token"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._writer() as conn:
                 cursor = conn.execute(
                     "UPDATE device_tokens SET is_active = 0 WHERE user_id = ? AND token = ?",
                     (user_id, token)
                 )
-                conn.commit()
                 return cursor.rowcount > 0
-        except sqlite3.Error as e:
-            print(f"Error deactivating device token: {e}")
+        except sqlite3.Error:
+            logger.exception("Error deactivating device token")
             return False
 
     def save_whatsapp_recommendation(self, ticker: str, company_name: Optional[str], price: Optional[float],
@@ -245,22 +639,42 @@ class AuthService:
                                      original_message: str, received_at: str) -> bool:
         """Save a WhatsApp recommendation"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._writer() as conn:
                 conn.execute("""
                     INSERT INTO whatsapp_recommendations
                     (ticker, company_name, price, change_percent, from_sender, chat_name, original_message, received_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (ticker.upper(), company_name, price, change_percent, from_sender, chat_name, original_message, received_at))
-                conn.commit()
+                    VALUES (upper(?), ?, ?, ?, ?, ?, ?, ?)
+                """, (ticker, company_name, price, change_percent, from_sender, chat_name, original_message, received_at))
                 return True
-        except sqlite3.Error as e:
-            print(f"Error saving WhatsApp recommendation: {e}")
+        except sqlite3.Error:
+            logger.exception("Error saving WhatsApp recommendation")
             return False
 
+    def save_whatsapp_recommendations_bulk(self, rows: List[tuple]) -> int:
+        """Save many WhatsApp recommendations in one transaction.
+
+        Takes (ticker, company_name, price, change_percent, from_sender,
+        chat_name, original_message, received_at) tuples — the same
+        fields as save_whatsapp_recommendation. Ingesting a backlog this
+        way pays one fsync for the whole batch instead of one per
+        message. Returns the number of rows inserted.
+        """
+        try:
+            with self._writer() as conn:
+                cursor = conn.executemany("""
+                    INSERT INTO whatsapp_recommendations
+                    (ticker, company_name, price, change_percent, from_sender, chat_name, original_message, received_at)
+                    VALUES (upper(?), ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                return cursor.rowcount
+        except sqlite3.Error:
+            logger.exception("Error saving WhatsApp recommendations in bulk")
+            return 0
+
     def get_whatsapp_recommendations(self, limit: int = 50, status: Optional[str] = None):
         """Get recent WhatsApp recommendations"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._reader() as conn:
                 if status:
                     cursor = conn.execute("""
                         SELECT id, ticker, company_name, price, change_percent, from_sender,
@@ -278,26 +692,12 @@ class AuthService:
                         ORDER BY received_at DESC
                         LIMIT ?
                     """, (limit,))
-                rows = cursor.fetchall()
-
-                recommendations = []
-                for row in rows:
-                    recommendations.append({
-                        'id': row[0],
-                        'ticker': row[1],
-                        'company_name': row[2],
-                        'price': row[3],
-                        'change_percent': row[4],
-                        'from_sender': row[5],
-                        'chat_name': row[6],
-                        'original_message': row[7],
-                        'received_at': row[8],
-                        'created_at': row[9],
-                        'status': row[10] if len(row) > 10 else 'pending'
-                    })
-                return recommendations
-        except sqlite3.Error as e:
-            print(f"Error getting WhatsApp recommendations: {e}")
+                # sqlite3.Row -> dict conversion happens in C, so there is
+                # no per-field subscripting at the Python level; iterating
+                # the cursor directly skips the fetchall intermediate list
+                return [dict(row) for row in cursor]
+        except sqlite3.Error:
+            logger.exception("Error getting WhatsApp recommendations")
             return []
 
     def add_trade(self, user_id: int, ticker: str, action: str, quantity: int,
@@ -305,21 +705,38 @@ class AuthService:
                   whatsapp_recommendation_id: Optional[int] = None) -> Optional[int]:
         """Add a new trade. Returns trade_id if successful."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._writer() as conn:
                 cursor = conn.execute("""
                     INSERT INTO trades (user_id, ticker, action, quantity, price, trade_date, notes, whatsapp_recommendation_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (user_id, ticker.upper(), action.upper(), quantity, price, trade_date, notes, whatsapp_recommendation_id))
-                conn.commit()
+                    VALUES (?, upper(?), upper(?), ?, ?, ?, ?, ?)
+                """, (user_id, ticker, action, quantity, price, trade_date, notes, whatsapp_recommendation_id))
                 return cursor.lastrowid
-        except sqlite3.Error as e:
-            print(f"Error adding trade: {e}")
+        except sqlite3.Error:
+            logger.exception("Error adding trade")
             return None
 
+    def add_trades_bulk(self, user_id: int, rows: List[tuple]) -> int:
+        """Add many trades for a user in one transaction.
+
+        Takes (ticker, action, quantity, price, trade_date, notes,
+        whatsapp_recommendation_id) tuples. Returns the number of rows
+        inserted.
+        """
+        try:
+            with self._writer() as conn:
+                cursor = conn.executemany("""
+                    INSERT INTO trades (user_id, ticker, action, quantity, price, trade_date, notes, whatsapp_recommendation_id)
+                    VALUES (?, upper(?), upper(?), ?, ?, ?, ?, ?)
+                """, [(user_id, *row) for row in rows])
+                return cursor.rowcount
+        except sqlite3.Error:
+            logger.exception("Error adding trades in bulk")
+            return 0
+
     def get_user_trades(self, user_id: int, limit: int = 100) -> List[Dict]:
         """Get all trades for a user, ordered by trade_date DESC."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._reader() as conn:
                 cursor = conn.execute("""
                     SELECT id, user_id, ticker, action, quantity, price, trade_date, notes, whatsapp_recommendation_id, created_at
                     FROM trades
@@ -327,78 +744,45 @@ class AuthService:
                     ORDER BY trade_date DESC, created_at DESC
                     LIMIT ?
                 """, (user_id, limit))
-                rows = cursor.fetchall()
-
-                trades = []
-                for row in rows:
-                    trades.append({
-                        'id': row[0],
-                        'user_id': row[1],
-                        'ticker': row[2],
-                        'action': row[3],
-                        'quantity': row[4],
-                        'price': row[5],
-                        'trade_date': row[6],
-                        'notes': row[7],
-                        'whatsapp_recommendation_id': row[8],
-                        'created_at': row[9]
-                    })
-                return trades
-        except sqlite3.Error as e:
-            print(f"Error getting trades: {e}")
+                return [dict(row) for row in cursor]
+        except sqlite3.Error:
+            logger.exception("Error getting trades")
             return []
 
     def delete_trade(self, user_id: int, trade_id: int) -> bool:
         """Delete a trade. Returns True if successful."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._writer() as conn:
                 cursor = conn.execute(
                     "DELETE FROM trades WHERE id = ? AND user_id = ?",
                     (trade_id, user_id)
                 )
-                conn.commit()
                 return cursor.rowcount > 0
-        except sqlite3.Error as e:
-            print(f"Error deleting trade: {e}")
+        except sqlite3.Error:
+            logger.exception("Error deleting trade")
             return False
 
     def get_user_positions(self, user_id: int) -> List[Dict]:
         """Calculate current positions grouped by ticker from trades."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._reader() as conn:
+                # Aggregate in SQLite so only one row per ticker crosses
+                # the driver instead of every trade ever made
                 cursor = conn.execute("""
-                    SELECT ticker, action, quantity, price
+                    SELECT ticker,
+                           SUM(CASE WHEN action = 'BUY' THEN quantity ELSE 0 END) AS bought,
+                           SUM(CASE WHEN action = 'SELL' THEN quantity ELSE 0 END) AS sold,
+                           SUM(CASE WHEN action = 'BUY' THEN quantity * price ELSE 0 END) AS cost
                     FROM trades
                     WHERE user_id = ?
-                    ORDER BY ticker, trade_date
+                    GROUP BY ticker
+                    HAVING bought <> sold
                 """, (user_id,))
 
-                trades = cursor.fetchall()
-
-                positions = {}
-                for ticker, action, quantity, price in trades:
-                    if ticker not in positions:
-                        positions[ticker] = {
-                            'ticker': ticker,
-                            'total_bought': 0,
-                            'total_sold': 0,
-                            'total_cost': 0.0
-                        }
-
-                    if action == 'BUY':
-                        positions[ticker]['total_bought'] += quantity
-                        positions[ticker]['total_cost'] += (quantity * price)
-                    elif action == 'SELL':
-                        positions[ticker]['total_sold'] += quantity
-
                 result = []
-                for ticker, data in positions.items():
-                    total_quantity = data['total_bought'] - data['total_sold']
-
-                    if total_quantity == 0:
-                        continue
-
-                    avg_cost = data['total_cost'] / data['total_bought'] if data['total_bought'] > 0 else 0
+                for ticker, bought, sold, cost in cursor:
+                    total_quantity = bought - sold
+                    avg_cost = cost / bought if bought > 0 else 0
 
                     result.append({
                         'ticker': ticker,
@@ -408,20 +792,41 @@ class AuthService:
                     })
 
                 return result
-        except sqlite3.Error as e:
-            print(f"Error getting positions: {e}")
+        except sqlite3.Error:
+            logger.exception("Error getting positions")
             return []
 
+    # --- Async facades -------------------------------------------------
+    # The web handlers are async; these run the sync reads on the default
+    # executor so a slow query never stalls the event loop. sqlite3
+    # releases the GIL while SQLite works, so the reads overlap for real.
+
+    async def get_user_favorites_async(self, user_id: int) -> List[StockFavorite]:
+        """Async wrapper around get_user_favorites for event-loop callers."""
+        return await asyncio.to_thread(self.get_user_favorites, user_id)
+
+    async def get_user_trades_async(self, user_id: int, limit: int = 100) -> List[Dict]:
+        """Async wrapper around get_user_trades for event-loop callers."""
+        return await asyncio.to_thread(self.get_user_trades, user_id, limit)
+
+    async def get_user_positions_async(self, user_id: int) -> List[Dict]:
+        """Async wrapper around get_user_positions for event-loop callers."""
+        return await asyncio.to_thread(self.get_user_positions, user_id)
+
+    async def get_whatsapp_recommendations_async(self, limit: int = 50,
+                                                 status: Optional[str] = None):
+        """Async wrapper around get_whatsapp_recommendations."""
+        return await asyncio.to_thread(self.get_whatsapp_recommendations, limit, status)
+
     def update_whatsapp_recommendation_status(self, recommendation_id: int, status: str) -> bool:
         """Update status of a recommendation (pending/accepted/rejected)."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._writer() as conn:
                 cursor = conn.execute(
                     "UPDATE whatsapp_recommendations SET status = ? WHERE id = ?",
                     (status, recommendation_id)
                 )
-                conn.commit()
                 return cursor.rowcount > 0
-        except sqlite3.Error as e:
-            print(f"Error updating recommendation status: {e}")
+        except sqlite3.Error:
+            logger.exception("Error updating recommendation status")
             return False
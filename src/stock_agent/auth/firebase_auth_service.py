@@ -1,5 +1,10 @@
+import hashlib
 import os
 import json
+import re
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 from datetime import datetime
 import firebase_admin
@@ -7,12 +12,26 @@ from firebase_admin import credentials, auth as firebase_auth
 from .models import User
 from .auth_service import AuthService
 
+# Anything that isn't a username character gets stripped in one C-level
+# substitution instead of a per-character Python loop
+_USERNAME_SANITIZE_RE = re.compile(r'[^a-z0-9_]+')
+
 
 class FirebaseAuthService:
     """Firebase Authentication service for validating ID tokens and managing users"""
     
+    # Verified tokens cached until their exp claim; SPAs and the mobile
+    # app resend the same ID token for every request within its ~1h
+    # validity window, so this skips the RSA verify on repeats
+    _TOKEN_CACHE_SIZE = 1000
+
     def __init__(self, auth_service: AuthService):
         self.auth_service = auth_service
+        self._token_cache: OrderedDict = OrderedDict()  # digest -> (claims, exp)
+        # Request handlers hit the cache concurrently; all reads and
+        # mutations stay under this lock so move_to_end/eviction can't
+        # race a concurrent delete
+        self._token_cache_lock = threading.Lock()
         self._initialize_firebase()
     
     def _initialize_firebase(self):
@@ -49,9 +68,20 @@ class FirebaseAuthService:
         Returns:
             Dictionary with user claims if valid, None if invalid
         """
+        # Repeat presentations of the same token skip the signature check
+        cache_key = hashlib.blake2b(id_token.encode(), digest_size=16).digest()
+        with self._token_cache_lock:
+            cached = self._token_cache.get(cache_key)
+            if cached is not None:
+                claims, exp = cached
+                if exp > time.time():
+                    self._token_cache.move_to_end(cache_key)
+                    return claims
+                self._token_cache.pop(cache_key, None)
+
         try:
             decoded_token = firebase_auth.verify_id_token(id_token)
-            return {
+            claims = {
                 'uid': decoded_token['uid'],
                 'email': decoded_token.get('email'),
                 'email_verified': decoded_token.get('email_verified', False),
@@ -63,6 +93,12 @@ class FirebaseAuthService:
                 'iat': decoded_token.get('iat'),
                 'firebase_claims': decoded_token
             }
+            if decoded_token.get('exp'):
+                with self._token_cache_lock:
+                    self._token_cache[cache_key] = (claims, decoded_token['exp'])
+                    while len(self._token_cache) > self._TOKEN_CACHE_SIZE:
+                        self._token_cache.popitem(last=False)
+            return claims
         except firebase_auth.InvalidIdTokenError:
             print("Invalid Firebase ID token")
             return None
@@ -93,80 +129,55 @@ class FirebaseAuthService:
             print(f"No email found in Firebase claims for UID: {firebase_uid}")
             return None
         
-        # Try to find existing user by email
+        # Returning users resolve straight from the UID lookup (cached)
+        user = self.auth_service.get_user_by_firebase_uid(firebase_uid)
+        if user:
+            return user
+
+        # Legacy rows created before we stored Firebase UIDs
         user = self._find_user_by_email(email)
-        
-        if not user:
-            # Create new user from Firebase data
-            user = self._create_user_from_firebase(firebase_claims)
-        
+        if user:
+            return user
+
+        # First login: single upsert round-trip instead of lookup+create
+        username = self._generate_username(email, firebase_claims.get('name', ''))
+        user = self.auth_service.upsert_firebase_user(
+            username=username,
+            email=email,
+            firebase_uid=firebase_uid
+        )
+
+        if user:
+            print(f"Created new user from Firebase: {email}")
+
         return user
     
     def _find_user_by_email(self, email: str) -> Optional[User]:
         """Find user by email in local database"""
         return self.auth_service.get_user_by_email(email)
     
-    def _create_user_from_firebase(self, firebase_claims: Dict[str, Any]) -> Optional[User]:
-        """Create new user from Firebase claims"""
-        try:
-            email = firebase_claims['email']
-            firebase_uid = firebase_claims['uid']
-            name = firebase_claims.get('name', '')
-            
-            # Generate username from email or name
-            username = self._generate_username(email, name)
-            
-            # Create user with Firebase UID
-            user = self.auth_service.create_user_from_firebase(
-                username=username,
-                email=email,
-                firebase_uid=firebase_uid
-            )
-            
-            if user:
-                print(f"Created new user from Firebase: {email}")
-            
-            return user
-            
-        except Exception as e:
-            print(f"Error creating user from Firebase claims: {e}")
-            return None
-    
     def _generate_username(self, email: str, name: str = "") -> str:
         """Generate unique username from email or name"""
         if name:
             # Use name if available, clean it up
             username = name.lower().replace(' ', '_').replace('.', '_')
-            username = ''.join(c for c in username if c.isalnum() or c == '_')
         else:
             # Use email prefix
             username = email.split('@')[0].lower()
-            username = ''.join(c for c in username if c.isalnum() or c == '_')
+        username = _USERNAME_SANITIZE_RE.sub('', username)
         
-        # Ensure uniqueness by checking database
-        original_username = username
+        # One query fetches every colliding name, then the free suffix is
+        # picked in Python instead of probing the database per candidate
+        taken = self.auth_service.get_colliding_usernames(username)
+        if username not in taken:
+            return username
+
         counter = 1
-        
-        while self._username_exists(username):
-            username = f"{original_username}_{counter}"
+        while f"{username}_{counter}" in taken:
             counter += 1
-        
-        return username
-    
-    def _username_exists(self, username: str) -> bool:
-        """Check if username already exists"""
-        import sqlite3
-        
-        try:
-            with sqlite3.connect(self.auth_service.db_path) as conn:
-                cursor = conn.execute(
-                    "SELECT 1 FROM users WHERE username = ?",
-                    (username,)
-                )
-                return cursor.fetchone() is not None
-        except Exception:
-            return False
-    
+
+        return f"{username}_{counter}"
+
     def get_user_from_firebase_token(self, id_token: str) -> Optional[User]:
         """
         Complete flow: verify token and get/create user
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from typing import Optional, List
 from datetime import datetime
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class User:
     id: Optional[int] = None
     username: str = ""
@@ -11,7 +11,7 @@ class User:
     created_at: Optional[datetime] = None
     is_active: bool = True
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class StockFavorite:
     id: Optional[int] = None
     user_id: int = 0
@@ -19,7 +19,7 @@ class StockFavorite:
     company_name: Optional[str] = None
     added_at: Optional[datetime] = None
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class StockData:
     ticker: str = ""
     company_name: str = ""
@@ -9,41 +9,61 @@ Users are automatically created via Firebase authentication.
 import argparse
 import sys
 import os
-import getpass
+import threading
 
-from ..auth import AuthService
-from ..notification_service import NotificationService, StockAlert
-from firebase_admin import auth as firebase_auth
-import firebase_admin
-from firebase_admin import credentials
-import json
+# Imported from the submodule directly: the auth package __init__ pulls
+# in the Firebase SDK, which costs hundreds of ms that list-users and
+# --help should not pay. Firebase/notification imports live inside the
+# functions that need them for the same reason.
+from ..auth.auth_service import AuthService
+
+# Set once by initialize_firebase so repeat calls (e.g. bulk create-user
+# loops) return without touching the SDK's private state or re-reading
+# credential env vars
+_firebase_initialized = False
+_firebase_init_lock = threading.Lock()
 
 
 def initialize_firebase():
     """Initialize Firebase Admin SDK"""
-    if firebase_admin._apps:
+    global _firebase_initialized
+    if _firebase_initialized:
         return
 
-    try:
-        creds_path = os.getenv('FIREBASE_CREDS_PATH')
-        if creds_path and os.path.exists(creds_path):
-            cred = credentials.Certificate(creds_path)
-        else:
-            service_account_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_JSON')
-            if service_account_json:
-                service_account_info = json.loads(service_account_json)
-                cred = credentials.Certificate(service_account_info)
+    import firebase_admin
+    from firebase_admin import credentials
+    import json
+
+    with _firebase_init_lock:
+        if _firebase_initialized:
+            return
+        if firebase_admin._apps:
+            _firebase_initialized = True
+            return
+
+        try:
+            creds_path = os.getenv('FIREBASE_CREDS_PATH')
+            if creds_path and os.path.exists(creds_path):
+                cred = credentials.Certificate(creds_path)
             else:
-                cred = credentials.ApplicationDefault()
+                service_account_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_JSON')
+                if service_account_json:
+                    service_account_info = json.loads(service_account_json)
+                    cred = credentials.Certificate(service_account_info)
+                else:
+                    cred = credentials.ApplicationDefault()
 
-        firebase_admin.initialize_app(cred)
-    except Exception as e:
-        print(f"❌ Failed to initialize Firebase Admin SDK: {e}")
-        sys.exit(1)
+            firebase_admin.initialize_app(cred)
+            _firebase_initialized = True
+        except Exception as e:
+            print(f"❌ Failed to initialize Firebase Admin SDK: {e}")
+            sys.exit(1)
 
 
 def create_user(email: str, password: str, username: str, auth_service: AuthService) -> bool:
     """Create a new user in Firebase and local database"""
+    from firebase_admin import auth as firebase_auth
+
     try:
         initialize_firebase()
 
@@ -88,38 +108,50 @@ def create_user(email: str, password: str, username: str, auth_service: AuthServ
         return False
 
 
-def list_users(auth_service: AuthService):
-    """List all users in the system (Firebase-authenticated users)"""
+def list_users(auth_service: AuthService, page: int = 1, page_size: int = 1000):
+    """List users in the system (Firebase-authenticated users)"""
     import sqlite3
+    from datetime import datetime
 
     try:
         with sqlite3.connect(auth_service.db_path) as conn:
+            total = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            if total == 0:
+                print("No users found in the system.")
+                print("Use 'create-user' command to add new users.")
+                return
+
+            # Stream rows straight off the cursor — no fetchall — so
+            # memory stays bounded by the page, and buffer the formatted
+            # lines into a single stdout write
             cursor = conn.execute("""
                 SELECT id, username, email, firebase_uid, created_at, is_active
                 FROM users
                 ORDER BY created_at DESC
-            """)
-            users = cursor.fetchall()
-
-            if not users:
-                print("No users found in the system.")
-                print("Use 'create-user' command to add new users.")
-                return
+                LIMIT ? OFFSET ?
+            """, (page_size, (page - 1) * page_size))
 
-            print("\n📋 User List:")
-            print("-" * 100)
-            print(f"{'ID':<4} {'Username':<20} {'Email':<30} {'Firebase UID':<20} {'Created':<20} {'Active':<6}")
-            print("-" * 100)
+            lines = ["\n📋 User List:", "-" * 100]
+            lines.append(f"{'ID':<4} {'Username':<20} {'Email':<30} {'Firebase UID':<20} {'Created':<20} {'Active':<6}")
+            lines.append("-" * 100)
 
-            for user in users:
-                user_id, username, email, firebase_uid, created_at, is_active = user
+            shown = 0
+            for user_id, username, email, firebase_uid, created_at, is_active in cursor:
                 status = "✅" if is_active else "❌"
-                created_str = created_at[:19] if created_at else "Unknown"
+                # created_at is epoch seconds on current databases; this
+                # plain connection skips the TIMESTAMP converter, so
+                # format numbers here (legacy rows may still be ISO text)
+                if isinstance(created_at, (int, float)):
+                    created_str = datetime.fromtimestamp(created_at).strftime('%Y-%m-%d %H:%M:%S')
+                else:
+                    created_str = str(created_at)[:19] if created_at else "Unknown"
                 firebase_uid_short = firebase_uid[:18] + "..." if firebase_uid and len(firebase_uid) > 20 else firebase_uid or "None"
-                print(f"{user_id:<4} {username:<20} {email:<30} {firebase_uid_short:<20} {created_str:<20} {status:<6}")
+                lines.append(f"{user_id:<4} {username:<20} {email:<30} {firebase_uid_short:<20} {created_str:<20} {status:<6}")
+                shown += 1
 
-            print("-" * 100)
-            print(f"Total users: {len(users)}")
+            lines.append("-" * 100)
+            lines.append(f"Users shown: {shown} of {total} (page {page})")
+            sys.stdout.write("\n".join(lines) + "\n")
 
     except Exception as e:
         print(f"❌ Error listing users: {e}")
@@ -128,8 +160,35 @@ def list_users(auth_service: AuthService):
 
 
 
+def import_users_csv(csv_path: str, auth_service: AuthService) -> bool:
+    """Bulk-import users from a CSV of username,email,firebase_uid rows"""
+    import csv
+
+    try:
+        with open(csv_path, newline='') as f:
+            rows = [
+                (row['username'], row['email'], row['firebase_uid'] or None)
+                for row in csv.DictReader(f)
+            ]
+
+        if not rows:
+            print("❌ No rows found in CSV")
+            return False
+
+        # One transaction for the whole file instead of a commit per user
+        inserted = auth_service.create_users_bulk(rows)
+        print(f"✅ Imported {inserted} of {len(rows)} users (duplicates skipped)")
+        return True
+
+    except (OSError, KeyError) as e:
+        print(f"❌ Error importing users: {e}")
+        return False
+
+
 def test_notification(topic: str = "stock_update", ticker: str = "AAPL") -> bool:
     """Send a test push notification to all users"""
+    from ..notification_service import NotificationService, StockAlert
+
     try:
         # Initialize notification service
         notification_service = NotificationService()
@@ -159,9 +218,24 @@ def test_notification(topic: str = "stock_update", ticker: str = "AAPL") -> bool
         return False
 
 
+def _sniff_subcommand(argv):
+    """Return the first non-flag argument, i.e. the subcommand name."""
+    return next((a for a in argv[1:] if not a.startswith('-')), None)
+
+
 def main():
     """Main CLI entry point"""
 
+    # Fast path: answer --version before touching dotenv, argparse, or
+    # the database
+    if len(sys.argv) == 2 and sys.argv[1] in ('-V', '--version'):
+        from importlib.metadata import version, PackageNotFoundError
+        try:
+            print(version('stock_agent'))
+        except PackageNotFoundError:
+            print("unknown")
+        return
+
     from dotenv import load_dotenv
 
     load_dotenv(".dev.env")
@@ -186,19 +260,32 @@ Examples:
 
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
-    # Create user command
-    create_user_parser = subparsers.add_parser('create-user', help='Create a new user in Firebase and local database')
-    create_user_parser.add_argument('--email', required=True, help='User email address')
-    create_user_parser.add_argument('--username', required=True, help='Username for the user')
-    create_user_parser.add_argument('--password', help='Password for the user (will prompt if not provided)')
-
-    # List users command
-    subparsers.add_parser('list-users', help='List all users in the system')
-
-    # Test notification command
-    test_notif_parser = subparsers.add_parser('test-notification', help='Send a test push notification')
-    test_notif_parser.add_argument('--topic', default='stock_updates', help='Firebase topic to send to (default: stock_updates)')
-    test_notif_parser.add_argument('--ticker', default='AAPL', help='Stock ticker for test notification (default: AAPL)')
+    # Register only the subparser being invoked — argparse's add_parser
+    # is surprisingly expensive and the others would be built just to be
+    # thrown away. Help/no-command/unknown falls back to registering all.
+    sniffed = _sniff_subcommand(sys.argv)
+    known_commands = {'create-user', 'import-users', 'list-users', 'test-notification'}
+    wanted = {sniffed} if sniffed in known_commands else known_commands
+
+    if 'create-user' in wanted:
+        create_user_parser = subparsers.add_parser('create-user', help='Create a new user in Firebase and local database')
+        create_user_parser.add_argument('--email', required=True, help='User email address')
+        create_user_parser.add_argument('--username', required=True, help='Username for the user')
+        create_user_parser.add_argument('--password', help='Password for the user (will prompt if not provided)')
+
+    if 'import-users' in wanted:
+        import_users_parser = subparsers.add_parser('import-users', help='Bulk-import users from a CSV file')
+        import_users_parser.add_argument('--csv', required=True, help='CSV file with username,email,firebase_uid columns')
+
+    if 'list-users' in wanted:
+        list_users_parser = subparsers.add_parser('list-users', help='List users in the system')
+        list_users_parser.add_argument('--page', type=int, default=1, help='Page number (default: 1)')
+        list_users_parser.add_argument('--page-size', type=int, default=1000, help='Users per page (default: 1000)')
+
+    if 'test-notification' in wanted:
+        test_notif_parser = subparsers.add_parser('test-notification', help='Send a test push notification')
+        test_notif_parser.add_argument('--topic', default='stock_updates', help='Firebase topic to send to (default: stock_updates)')
+        test_notif_parser.add_argument('--ticker', default='AAPL', help='Stock ticker for test notification (default: AAPL)')
 
     args = parser.parse_args()
 
@@ -206,8 +293,11 @@ Examples:
         parser.print_help()
         sys.exit(1)
 
-    # Initialize auth service
-    auth_service = AuthService(db_path=args.db_path)
+    # test-notification never touches the user database, so only the
+    # commands that do pay for opening (and possibly creating) it
+    auth_service = None
+    if args.command in ('create-user', 'import-users', 'list-users'):
+        auth_service = AuthService(db_path=args.db_path)
 
     print(f"🔧 Stock Agent Admin Tool")
     print(f"📁 Database: {args.db_path}")
@@ -217,6 +307,7 @@ Examples:
     if args.command == 'create-user':
         password = args.password
         if not password:
+            import getpass
             password = getpass.getpass("Enter password: ")
             password_confirm = getpass.getpass("Confirm password: ")
             if password != password_confirm:
@@ -226,8 +317,12 @@ Examples:
         success = create_user(args.email, password, args.username, auth_service)
         sys.exit(0 if success else 1)
 
+    elif args.command == 'import-users':
+        success = import_users_csv(args.csv, auth_service)
+        sys.exit(0 if success else 1)
+
     elif args.command == 'list-users':
-        list_users(auth_service)
+        list_users(auth_service, page=args.page, page_size=args.page_size)
 
     elif args.command == 'test-notification':
         success = test_notification(args.topic, args.ticker)
@@ -1,38 +1,51 @@
 import os
 import sys
 import argparse
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 
 from .web import create_web_app
 
+
+@lru_cache(maxsize=None)
+def _load_env_once(env: str):
+    """Load the env file for ``env``, falling back to .env.
+
+    Cached so reloaders and test harnesses that call main() repeatedly
+    only pay for the dotenv parse and os.path.exists probes once per
+    process. Returns the path loaded, or None if no file was found.
+    """
+    env_file = '.dev.env' if env == 'dev' else '.prod.env'
+    for candidate in (env_file, '.env'):
+        if os.path.exists(candidate):
+            load_dotenv(dotenv_path=candidate)
+            return candidate
+    return None
+
+
+# Built once at import: reloaders and test harnesses call main()
+# repeatedly, and ArgumentParser construction is pure overhead after the
+# first time. parse_known_args leaves unknown args for the Robyn CLI.
+_parser = argparse.ArgumentParser(description='Stock Agent Server')
+_parser.add_argument('--env',
+                     choices=['dev', 'prod'],
+                     default='dev',
+                     help='Environment to run (dev or prod). Default: dev')
+
+
 def main():
     """Run the Stock Agent server"""
 
-    # Parse command-line arguments (allow unknown args for Robyn CLI)
-    parser = argparse.ArgumentParser(description='Stock Agent Server')
-    parser.add_argument('--env',
-                       choices=['dev', 'prod'],
-                       default='dev',
-                       help='Environment to run (dev or prod). Default: dev')
-    args, unknown_args = parser.parse_known_args()
+    args, unknown_args = _parser.parse_known_args()
 
     # Pass unknown args back to sys.argv for Robyn to process
     sys.argv = [sys.argv[0]] + unknown_args
 
     # Load environment variables based on --env flag
-    if args.env == 'dev':
-        env_file = '.dev.env'
-    else:
-        env_file = '.prod.env'
-
-    # Try to load the specified env file, fallback to .env
-    if os.path.exists(env_file):
-        load_dotenv(dotenv_path=env_file)
-        print(f"Loaded environment from {env_file}")
-    elif os.path.exists('.env'):
-        load_dotenv(dotenv_path='.env')
-        print(f"Loaded environment from .env (fallback)")
+    loaded = _load_env_once(args.env)
+    if loaded:
+        print(f"Loaded environment from {loaded}")
     else:
         print("No environment file found, using system environment")
 
@@ -1,9 +1,11 @@
 from typing import Dict, Any, Optional
-import firebase_admin
-from firebase_admin import messaging, credentials
 import os
-from dataclasses import dataclass
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import cached_property
 
 @dataclass
 class StockAlert:
@@ -11,65 +13,194 @@ class StockAlert:
     percent_change: float
     current_price: float
     alert_type: str  # 'gainer' or 'loser'
-    timestamp: datetime = datetime.now()
+    # default_factory, not datetime.now(): the latter would be evaluated
+    # once at class definition, stamping every alert with import time
+    timestamp: datetime = field(default_factory=datetime.now)
+
+    # Derived strings are computed once per alert, so fanning the same
+    # alert out to many topics reformats nothing
+
+    @cached_property
+    def title(self) -> str:
+        return f"Stock {self.alert_type.title()} Alert: {self.ticker}"
+
+    @cached_property
+    def body(self) -> str:
+        return f"{self.ticker} has moved {self.percent_change:.2f}% " \
+               f"({'up' if self.percent_change > 0 else 'down'}) " \
+               f"to ${self.current_price:.2f}"
+
+    @cached_property
+    def data_payload(self) -> Dict[str, str]:
+        return {
+            'ticker': self.ticker,
+            'percent_change': f"{self.percent_change:.2f}",
+            'current_price': f"{self.current_price:.2f}",
+            'alert_type': self.alert_type,
+            'timestamp': self.timestamp.isoformat(),
+        }
+
+# One firebase_admin App (and its parsed service-account credential) is
+# shared by every NotificationService in the process: parsing the
+# credential means a disk read plus an RSA key parse, and separate apps
+# would each open their own connection pool
+_APP = None
+_CRED = None
+_APP_LOCK = threading.Lock()
+
 
 class NotificationService:
     def __init__(self, creds_path: Optional[str] = None):
         """Initialize Firebase with credentials if not already initialized"""
-        # Check if Firebase is already initialized
-        if not firebase_admin._apps:
-            if not creds_path:
-                creds_path = os.getenv('FIREBASE_CREDS_PATH')
+        # Deferred so importing this module (e.g. for the StockAlert
+        # dataclass) doesn't pull in the Firebase SDK and its grpc/
+        # protobuf tree
+        import firebase_admin
+        from firebase_admin import credentials
+
+        global _APP, _CRED
+        with _APP_LOCK:
+            if _APP is None:
+                if firebase_admin._apps:
+                    # Someone else (e.g. the admin CLI) initialized first
+                    _APP = firebase_admin.get_app()
+                else:
+                    if not creds_path:
+                        creds_path = os.getenv('FIREBASE_CREDS_PATH')
 
-            if not creds_path:
-                raise ValueError("Firebase credentials path not provided")
+                    if not creds_path:
+                        raise ValueError("Firebase credentials path not provided")
 
-            cred = credentials.Certificate(creds_path)
-            firebase_admin.initialize_app(cred)
-        else:
-            print("Firebase already initialized, reusing existing app")
+                    if _CRED is None:
+                        _CRED = credentials.Certificate(creds_path)
+                    _APP = firebase_admin.initialize_app(_CRED)
+        self._app = _APP
+
+        # Fire-and-forget dispatch: the queue and its drain thread are
+        # created on first use so callers that only send synchronously
+        # never pay for them
+        self._queue: Optional[queue.Queue] = None
+        self._dispatcher_lock = threading.Lock()
+
+    # FCM caps batch sends at 500 messages per call
+    _MAX_BATCH = 500
+
+    def _build_message(self, alert: StockAlert, topic: Optional[str] = None,
+                       token: Optional[str] = None):
+        """Build the FCM message for an alert, addressed to a topic or token"""
+        from firebase_admin import messaging
+
+        return messaging.Message(
+            # Copied because the SDK may mutate the payload it is given
+            data=dict(alert.data_payload),
+            notification=messaging.Notification(
+                title=alert.title,
+                body=alert.body
+            ),
+            topic=topic,
+            token=token,
+        )
 
     def send_notification_to_topic(self, topic: str, alert: StockAlert) -> bool:
         """Send a notification to all devices subscribed to a specific topic"""
+        from firebase_admin import messaging
+
         try:
-            message = messaging.Message(
-                data={
-                    'ticker': alert.ticker,
-                    'percent_change': f"{alert.percent_change:.2f}",
-                    'current_price': f"{alert.current_price:.2f}",
-                    'alert_type': alert.alert_type,
-                    'timestamp': alert.timestamp.isoformat(),
-                },
-                notification=messaging.Notification(
-                    title=f"Stock {alert.alert_type.title()} Alert: {alert.ticker}",
-                    body=f"{alert.ticker} has moved {alert.percent_change:.2f}% " \
-                         f"({'up' if alert.percent_change > 0 else 'down'}) " \
-                         f"to ${alert.current_price:.2f}"
-                ),
-                topic=topic,
-            )
-
-            response = messaging.send(message)
+            message = self._build_message(alert, topic=topic)
+
+            response = messaging.send(message, app=self._app)
             print(f"Response: {response}")
             return bool(response)
         except Exception as e:
             print(f"Error sending notification: {str(e)}")
             return False
 
-    def subscribe_to_topic(self, token: str, topic: str) -> bool:
-        """Subscribe a device token to a specific topic"""
+    def send_batch_to_topics(self, pairs) -> list:
+        """Send many (topic, alert) notifications in batched FCM calls.
+
+        One send_each call covers up to 500 messages over a single
+        multiplexed connection instead of one HTTP round trip per alert.
+        Returns a per-pair list of success booleans.
+        """
+        from firebase_admin import messaging
+
+        results = []
         try:
-            response = messaging.subscribe_to_topic(tokens=[token], topic=topic)
-            return response.success_count > 0
+            messages = [self._build_message(alert, topic=topic) for topic, alert in pairs]
+            for start in range(0, len(messages), self._MAX_BATCH):
+                batch = messaging.send_each(messages[start:start + self._MAX_BATCH], app=self._app)
+                results.extend(r.success for r in batch.responses)
         except Exception as e:
-            print(f"Error subscribing to topic: {str(e)}")
-            return False
+            print(f"Error sending notification batch: {str(e)}")
+            results.extend([False] * (len(pairs) - len(results)))
+        return results
+
+    def queue_notification_to_topic(self, topic: str, alert: StockAlert):
+        """Enqueue a notification and return immediately.
+
+        A daemon thread drains the queue, coalescing alerts that arrive
+        within a 50 ms window into one batched FCM call, so request
+        handlers pay enqueue cost instead of a network round trip.
+        """
+        if self._queue is None:
+            with self._dispatcher_lock:
+                if self._queue is None:
+                    self._queue = queue.Queue()
+                    threading.Thread(target=self._drain_queue, daemon=True).start()
+        self._queue.put((topic, alert))
+
+    def _drain_queue(self):
+        """Dispatcher loop: batch queued alerts and send them together."""
+        while True:
+            pairs = [self._queue.get()]
+            # Short coalescing window picks up alerts sent in bursts
+            deadline = time.monotonic() + 0.05
+            while len(pairs) < self._MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pairs.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.send_batch_to_topics(pairs)
+
+    # FCM topic management accepts up to 1000 tokens per call
+    _MAX_TOPIC_BATCH = 1000
+
+    def _manage_topic(self, op_name: str, tokens, topic: str) -> bool:
+        """Run a topic subscribe/unsubscribe over one token or a list.
+
+        Token lists are chunked to FCM's 1000-token limit and the chunks
+        are issued concurrently, so onboarding N users costs ceil(N/1000)
+        overlapping requests instead of N serial round trips.
+        """
+        from firebase_admin import messaging
+
+        op = getattr(messaging, op_name)
+        if isinstance(tokens, str):
+            tokens = [tokens]
+
+        chunks = [tokens[start:start + self._MAX_TOPIC_BATCH]
+                  for start in range(0, len(tokens), self._MAX_TOPIC_BATCH)]
 
-    def unsubscribe_from_topic(self, token: str, topic: str) -> bool:
-        """Unsubscribe a device token from a specific topic"""
         try:
-            response = messaging.unsubscribe_from_topic(tokens=[token], topic=topic)
-            return response.success_count > 0
+            if len(chunks) == 1:
+                responses = [op(tokens=chunks[0], topic=topic, app=self._app)]
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    responses = list(pool.map(
+                        lambda chunk: op(tokens=chunk, topic=topic, app=self._app), chunks))
+            return sum(r.success_count for r in responses) > 0
         except Exception as e:
-            print(f"Error unsubscribing from topic: {str(e)}")
+            print(f"Error managing topic subscription: {str(e)}")
             return False
+
+    def subscribe_to_topic(self, tokens, topic: str) -> bool:
+        """Subscribe one device token or a list of tokens to a topic"""
+        return self._manage_topic('subscribe_to_topic', tokens, topic)
+
+    def unsubscribe_from_topic(self, tokens, topic: str) -> bool:
+        """Unsubscribe one device token or a list of tokens from a topic"""
+        return self._manage_topic('unsubscribe_from_topic', tokens, topic)
@@ -9,6 +9,16 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass
 
 
+def _recent_date_candidates(days: int = 5) -> List[str]:
+    """Date strings for the last ``days`` days, newest first.
+
+    Computed once per lookup so the retry loops below don't re-read the
+    clock and re-run strftime on every iteration.
+    """
+    today = datetime.now()
+    return [(today - timedelta(days=d)).strftime('%Y-%m-%d') for d in range(1, days + 1)]
+
+
 @dataclass
 class StockMetrics:
     """Represents daily market metrics for a stock.
@@ -77,19 +87,6 @@ class StockService:
 
         self.current_summary = None
 
-    def _get_trend(self, df: pd.DataFrame, ticker: str) -> float:
-        """Given DF and ticker, calculate the percentage change over all dates in the row"""
-        # Get the row for the ticker
-        row = df.loc[ticker]
-
-        # Get the earliest and latest StockMetrics objects
-        earliest_metrics = row.iloc[-1]  # Last column is earliest date
-        latest_metrics = row.iloc[0]     # First column is latest date
-
-        # Calculate total percentage change
-        percent_change = ((latest_metrics.close - earliest_metrics.close) / earliest_metrics.close) * 100
-        return percent_change
-
     def generate_market_summary(self):
         """
         Get market summary for the last five days, organized by ticker and date.
@@ -157,9 +154,15 @@ class StockService:
         # Sort columns by date (most recent first)
         df = df[sorted(dates, reverse=True)]
 
-        curr_trend_col = [self._get_trend(df, ticker) for ticker in df.index.values]
-
-        df['Trend'] = curr_trend_col
+        # Walk the latest/earliest columns directly instead of building a
+        # row Series per ticker with df.loc — two column reads replace
+        # thousands of per-ticker row constructions
+        latest_col = df.columns[0]     # Most recent date
+        earliest_col = df.columns[-1]  # Oldest date
+        df['Trend'] = [
+            ((latest.close - earliest.close) / earliest.close) * 100
+            for latest, earliest in zip(df[latest_col], df[earliest_col])
+        ]
 
         self.current_summary = df
 
@@ -194,11 +197,9 @@ class StockService:
         try:
             # Get stock data from grouped aggregates using previous trading day
             # (free tier doesn't allow current day data)
-            from datetime import datetime, timedelta
 
             # Try the last few days to find a trading day
-            for days_back in range(1, 6):  # Try up to 5 days back
-                test_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
+            for test_date in _recent_date_candidates():
                 ticker_data = self.stock_worker.get_stock_data_from_aggregates(tickers, test_date)
                 if ticker_data:  # Found data for this date
                     break
@@ -269,11 +270,9 @@ class StockService:
 
         try:
             # Get stock data from grouped aggregates using previous trading day
-            from datetime import datetime, timedelta
 
             # Try the last few days to find a trading day
-            for days_back in range(1, 6):  # Try up to 5 days back
-                test_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
+            for test_date in _recent_date_candidates():
                 ticker_data = self.stock_worker.get_stock_data_from_aggregates(major_tickers, test_date)
                 if ticker_data:  # Found data for this date
                     break
@@ -2,6 +2,8 @@ import os
 import pathlib
 from typing import Optional
 
+import orjson
+
 from robyn import Robyn, Request, Response, serve_file
 from robyn.templating import JinjaTemplate
 
@@ -17,11 +19,54 @@ def create_web_app() -> Robyn:
     app = Robyn(__file__)
     jinja_template = JinjaTemplate(os.path.join(src_path, "templates"))
 
+    # Static asset paths never change, so build them once instead of
+    # re-joining on every request
+    static_js_dir = os.path.join(src_path, "static", "js")
+    messaging_sw_path = os.path.join(static_js_dir, "firebase-messaging-sw.js")
+    auth_sw_path = os.path.join(static_js_dir, "firebase-auth-sw.js")
+
     # Initialize services
-    auth_service = AuthService()
+    auth_service = AuthService(db_path=os.getenv('AUTH_DB_PATH', 'users.db'))
     firebase_auth_service = FirebaseAuthService(auth_service)
     stock_service = StockService()
     
+    # Env vars are fixed once dotenv has loaded, so the client-facing
+    # Firebase config is read once here instead of per request
+    firebase_client_config = {
+        "apiKey": os.environ.get("FIREBASE_API_KEY"),
+        "authDomain": os.environ.get("FIREBASE_AUTH_DOMAIN"),
+        "projectId": os.environ.get("FIREBASE_PROJECT_ID"),
+        "messagingSenderId": os.environ.get("FIREBASE_MESSAGING_SENDER_ID"),
+        "appId": os.environ.get("FIREBASE_APP_ID")
+    }
+    vapid_public_key = os.getenv('FIREBASE_VAPID_PUBLIC_KEY')
+
+    # Serialized once at startup; the config endpoints then return a
+    # prebuilt Response instead of re-encoding the same dict on every
+    # request
+    firebase_config_response = Response(
+        status_code=200,
+        description=orjson.dumps(firebase_client_config),
+        headers={"Content-Type": "application/json"}
+    )
+    vapid_key_response = Response(
+        status_code=200,
+        description=orjson.dumps({"vapidPublicKey": vapid_public_key}),
+        headers={"Content-Type": "application/json"}
+    )
+
+    # These pages always render with the same context (Firebase handles
+    # user state client-side), so render them once at startup and serve
+    # the cached strings
+    static_page_context = {
+        "framework": "Robyn",
+        "templating_engine": "Jinja2",
+        "user": None
+    }
+    dashboard_html = jinja_template.render_template("dashboard.html", **static_page_context)
+    portfolio_html = jinja_template.render_template("portfolio.html", **static_page_context)
+    login_html = jinja_template.render_template("login.html")
+
     # Initialize notification service (will reuse existing Firebase app)
     notification_service = None
     try:
@@ -78,11 +123,11 @@ def create_web_app() -> Robyn:
     @app.get("/firebase-messaging-sw.js")
     async def firebase_service_worker(request: Request):
         # Serve the Firebase messaging service worker
-        return serve_file(os.path.join(src_path, "static", "js", "firebase-messaging-sw.js"))
+        return serve_file(messaging_sw_path)
 
     @app.get("/firebase-auth-sw.js")
     async def firebase_auth_service_worker(request: Request):
-        return serve_file(os.path.join(src_path, "static", "js", "firebase-auth-sw.js"))
+        return serve_file(auth_sw_path)
 
     @app.get("/static/js/:filename")
     async def serve_js_files(request: Request):
@@ -90,7 +135,7 @@ def create_web_app() -> Robyn:
         if not filename or ".." in filename:
             return Response(status_code=404, description="Not Found", headers={})
 
-        file_path = os.path.join(src_path, "static", "js", filename)
+        file_path = os.path.join(static_js_dir, filename)
         if os.path.exists(file_path) and filename.endswith('.js'):
             return serve_file(file_path)
         else:
@@ -107,8 +152,7 @@ def create_web_app() -> Robyn:
                 headers={"Location": "/"}
             )
 
-        template = jinja_template.render_template("login.html")
-        return template
+        return login_html
 
     @app.post("/login")
     async def login_submit(request: Request):
@@ -173,13 +217,7 @@ def create_web_app() -> Robyn:
     async def index(request: Request):
         # For Firebase auth, we'll let the frontend handle authentication
         # The template will check Firebase auth state and redirect if needed
-        context = {
-            "framework": "Robyn",
-            "templating_engine": "Jinja2",
-            "user": None  # Firebase auth will handle user info
-        }
-        template = jinja_template.render_template("dashboard.html", **context)
-        return template
+        return dashboard_html
 
     @app.get('/report')
     async def todays_report(request: Request):
@@ -204,13 +242,7 @@ def create_web_app() -> Robyn:
         """Render portfolio page"""
         # For Firebase auth, we'll let the frontend handle authentication
         # The template will check Firebase auth state and redirect if needed
-        context = {
-            "framework": "Robyn",
-            "templating_engine": "Jinja2",
-            "user": None  # Firebase auth will handle user info
-        }
-        template = jinja_template.render_template("portfolio.html", **context)
-        return template
+        return portfolio_html
 
     # API routes - require Firebase authentication
     @app.get('/api/vapid-public-key')
@@ -222,7 +254,7 @@ def create_web_app() -> Robyn:
                 description='{"error": "Authentication required"}',
                 headers={"Content-Type": "application/json"}
             )
-        return {'vapidPublicKey': os.getenv('FIREBASE_VAPID_PUBLIC_KEY')}
+        return vapid_key_response
 
     @app.get('/api/firebase-config')
     async def get_firebase_config(request: Request):
@@ -234,26 +266,12 @@ def create_web_app() -> Robyn:
                 headers={"Content-Type": "application/json"}
             )
 
-        config = {
-            "apiKey": os.environ.get("FIREBASE_API_KEY"),
-            "authDomain": os.environ.get("FIREBASE_AUTH_DOMAIN"),
-            "projectId": os.environ.get("FIREBASE_PROJECT_ID"),
-            "messagingSenderId": os.environ.get("FIREBASE_MESSAGING_SENDER_ID"),
-            "appId": os.environ.get("FIREBASE_APP_ID")
-        }
-        return config
+        return firebase_config_response
 
     @app.get('/api/firebase-config-public')
     async def get_firebase_config_public(request: Request):
         """Public endpoint for Firebase config - no authentication required"""
-        config = {
-            "apiKey": os.environ.get("FIREBASE_API_KEY"),
-            "authDomain": os.environ.get("FIREBASE_AUTH_DOMAIN"),
-            "projectId": os.environ.get("FIREBASE_PROJECT_ID"),
-            "messagingSenderId": os.environ.get("FIREBASE_MESSAGING_SENDER_ID"),
-            "appId": os.environ.get("FIREBASE_APP_ID")
-        }
-        return config
+        return firebase_config_response
 
     @app.get('/api/auth/status')
     async def get_auth_status(request: Request):
@@ -312,7 +330,7 @@ def create_web_app() -> Robyn:
             results = stock_service.search_stocks(query)
 
             # Get user favorites to show correct button state
-            favorites = auth_service.get_user_favorites(user.id)
+            favorites = await auth_service.get_user_favorites_async(user.id)
             user_favorites = {fav.ticker for fav in favorites}
 
             template = jinja_template.render_template(
@@ -337,7 +355,7 @@ def create_web_app() -> Robyn:
             return template
 
         try:
-            favorites = auth_service.get_user_favorites(user.id)
+            favorites = await auth_service.get_user_favorites_async(user.id)
             template = jinja_template.render_template("fragments/favorites_list.html", favorites=favorites)
             return template
         except Exception as e:
@@ -374,7 +392,7 @@ def create_web_app() -> Robyn:
             success = auth_service.add_favorite(user.id, ticker, company_name)
             if success:
                 # Return updated favorites list for HTMX
-                favorites = auth_service.get_user_favorites(user.id)
+                favorites = await auth_service.get_user_favorites_async(user.id)
                 template = jinja_template.render_template("fragments/favorites_list.html", favorites=favorites)
                 return template
             else:
@@ -403,7 +421,7 @@ def create_web_app() -> Robyn:
             success = auth_service.remove_favorite(user.id, ticker)
             if success:
                 # Return updated favorites list for HTMX
-                favorites = auth_service.get_user_favorites(user.id)
+                favorites = await auth_service.get_user_favorites_async(user.id)
                 template = jinja_template.render_template("fragments/favorites_list.html", favorites=favorites)
                 return template
             else:
@@ -421,7 +439,7 @@ def create_web_app() -> Robyn:
             return jinja_template.render_template("fragments/error.html", message="Unauthorized")
 
         try:
-            favorites = auth_service.get_user_favorites(user.id)
+            favorites = await auth_service.get_user_favorites_async(user.id)
             if not favorites:
                 return jinja_template.render_template("fragments/dashboard_favorites.html", favorites=[])
 
@@ -607,7 +625,7 @@ def create_web_app() -> Robyn:
                 auth_service.update_whatsapp_recommendation_status(whatsapp_recommendation_id, 'accepted')
 
             # Return updated trades list
-            trades = auth_service.get_user_trades(user.id)
+            trades = await auth_service.get_user_trades_async(user.id)
             return jinja_template.render_template("fragments/trades_list.html", trades=trades)
 
         except Exception as e:
@@ -623,7 +641,7 @@ def create_web_app() -> Robyn:
             return jinja_template.render_template("fragments/error.html", message="Unauthorized")
 
         try:
-            trades = auth_service.get_user_trades(user.id)
+            trades = await auth_service.get_user_trades_async(user.id)
             return jinja_template.render_template("fragments/trades_list.html", trades=trades)
         except Exception as e:
             print(f"Error getting trades: {e}")
@@ -646,7 +664,7 @@ def create_web_app() -> Robyn:
                 return jinja_template.render_template("fragments/error.html", message="Failed to delete trade")
 
             # Return updated trades list
-            trades = auth_service.get_user_trades(user.id)
+            trades = await auth_service.get_user_trades_async(user.id)
             return jinja_template.render_template("fragments/trades_list.html", trades=trades)
 
         except Exception as e:
@@ -661,7 +679,7 @@ def create_web_app() -> Robyn:
             return jinja_template.render_template("fragments/error.html", message="Unauthorized")
 
         try:
-            positions = auth_service.get_user_positions(user.id)
+            positions = await auth_service.get_user_positions_async(user.id)
 
             if not positions:
                 return jinja_template.render_template("fragments/portfolio_positions.html", positions=[])
@@ -696,8 +714,8 @@ def create_web_app() -> Robyn:
             return jinja_template.render_template("fragments/error.html", message="Unauthorized")
 
         try:
-            positions = auth_service.get_user_positions(user.id)
-            trades = auth_service.get_user_trades(user.id)
+            positions = await auth_service.get_user_positions_async(user.id)
+            trades = await auth_service.get_user_trades_async(user.id)
 
             if not positions:
                 return jinja_template.render_template("fragments/portfolio_summary.html",
@@ -741,7 +759,7 @@ def create_web_app() -> Robyn:
             return jinja_template.render_template("fragments/error.html", message="Unauthorized")
 
         try:
-            positions = auth_service.get_user_positions(user.id)
+            positions = await auth_service.get_user_positions_async(user.id)
 
             if not positions:
                 return jinja_template.render_template("fragments/dashboard_portfolio.html",
@@ -836,7 +854,7 @@ def create_web_app() -> Robyn:
                 return jinja_template.render_template("fragments/error.html", message="Invalid recommendation ID")
 
             # Get recommendation details
-            recommendations = auth_service.get_whatsapp_recommendations(limit=1000)
+            recommendations = await auth_service.get_whatsapp_recommendations_async(limit=1000)
             recommendation = next((r for r in recommendations if r['id'] == rec_id), None)
 
             if not recommendation:
@@ -871,7 +889,7 @@ def create_web_app() -> Robyn:
                 return jinja_template.render_template("fragments/error.html", message="Failed to reject recommendation")
 
             # Return updated recommendations list
-            recommendations = auth_service.get_whatsapp_recommendations(limit=50)
+            recommendations = await auth_service.get_whatsapp_recommendations_async(limit=50)
             return jinja_template.render_template("fragments/whatsapp_recommendations.html",
                 recommendations=recommendations)
 
@@ -969,7 +987,7 @@ def create_web_app() -> Robyn:
 
         try:
             limit = int(request.query_params.get('limit', '20'))
-            recommendations = auth_service.get_whatsapp_recommendations(limit)
+            recommendations = await auth_service.get_whatsapp_recommendations_async(limit)
 
             return jinja_template.render_template("fragments/whatsapp_recommendations.html", recommendations=recommendations)
         except Exception as e: